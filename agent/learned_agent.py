@@ -1,6 +1,11 @@
+import hashlib
+import io
+from dataclasses import asdict
+
 import torch
-from models.policy import TinyVLAPolicy
-from env.renderer import render_obs
+from models.dataset import image_to_tensor
+from models.policy import TinyVLAPolicy, load_checkpoint
+from env.renderer import RenderConfig, render_obs
 
 
 ACTION_UP = 0
@@ -11,52 +16,81 @@ ACTION_PICK = 4
 ACTION_DROP = 5
 
 
+def mask_logits(logits, obs):
+    """Mask (in place) the actions that can't change state in `obs`."""
+    r, c = tuple(obs["agent_pos"])
+
+    # Infer grid size from coords present (agent + objects)
+    coords = [tuple(obs["agent_pos"])] + [tuple(o["pos"]) for o in obs.get("objects", [])]
+    max_rc = max(max(rr, cc) for rr, cc in coords) if coords else 0
+    grid_size = int(max_rc + 1)
+
+    # Boundary masks: prevent actions that won't change state
+    if r == 0:
+        logits[ACTION_UP] = -1e9
+    if r == grid_size - 1:
+        logits[ACTION_DOWN] = -1e9
+    if c == 0:
+        logits[ACTION_LEFT] = -1e9
+    if c == grid_size - 1:
+        logits[ACTION_RIGHT] = -1e9
+
+    # PICK only if standing on an object and not holding already
+    on_object = any(tuple(o["pos"]) == (r, c) for o in obs.get("objects", []))
+    if (not on_object) or (obs.get("holding") is not None):
+        logits[ACTION_PICK] = -1e9
+
+    # DROP only if holding something
+    if obs.get("holding") is None:
+        logits[ACTION_DROP] = -1e9
+
+    return logits
+
+
 class LearnedAgent:
-    def __init__(self, vocab, checkpoint_path="policy.pt"):
-        self.vocab = vocab
-        self.model = TinyVLAPolicy(vocab)
-        self.model.load_state_dict(torch.load(checkpoint_path, map_location="cpu"))
+    def __init__(self, vocab=None, checkpoint_path="policy.pt"):
+        """
+        `checkpoint_path` may also be an open binary file. `vocab` is only used
+        for old checkpoints that don't carry one, and may be a zero-arg
+        callable so callers can skip building it when it isn't needed.
+        """
+        if hasattr(checkpoint_path, "read"):
+            data = checkpoint_path.read()
+        else:
+            with open(checkpoint_path, "rb") as f:
+                data = f.read()
+        # Hash the exact bytes we load, so the digest always names these weights
+        self.checkpoint_sha256 = hashlib.sha256(data).hexdigest()
+        state_dict, meta = load_checkpoint(io.BytesIO(data))
+
+        # Newer checkpoints carry the architecture, vocab and render config they
+        # were trained with; older ones need the caller's vocab and use defaults.
+        if "vocab" in meta:
+            self.vocab = meta["vocab"]
+        else:
+            self.vocab = vocab() if callable(vocab) else vocab
+        if self.vocab is None:
+            raise ValueError("checkpoint has no vocab saved; pass one in")
+        self.render_config = RenderConfig(**meta.get("render_config", {}))
+
+        self.model = TinyVLAPolicy(self.vocab, **meta.get("model_config", {}))
+        self.model.load_state_dict(state_dict)
         self.model.eval()
 
     def act(self, obs):
-        # Render observation to image tensor
-        img = render_obs(obs)
-        img = torch.from_numpy(
-            (torch.ByteTensor(torch.ByteStorage.from_buffer(img.tobytes()))
-             .view(img.size[1], img.size[0], 3)
-             .numpy())
-        ).float() / 255.0
-        img = img.permute(2, 0, 1)
+        return int(torch.argmax(self.logits(obs)).item())
+
+    def obs_to_tensor(self, obs):
+        # Render at the resolution the model was trained on
+        return image_to_tensor(render_obs(obs, **asdict(self.render_config)))
+
+    def logits(self, obs):
+        """Action logits for `obs` with the invalid-action masks applied."""
+        img = self.obs_to_tensor(obs)
 
         instruction = obs["instruction"]
 
         with torch.no_grad():
             logits = self.model(img, instruction).clone()
 
-        r, c = tuple(obs["agent_pos"])
-
-        # Infer grid size from coords present (agent + objects)
-        coords = [tuple(obs["agent_pos"])] + [tuple(o["pos"]) for o in obs.get("objects", [])]
-        max_rc = max(max(rr, cc) for rr, cc in coords) if coords else 0
-        grid_size = int(max_rc + 1)
-
-        # Boundary masks: prevent actions that won't change state
-        if r == 0:
-            logits[ACTION_UP] = -1e9
-        if r == grid_size - 1:
-            logits[ACTION_DOWN] = -1e9
-        if c == 0:
-            logits[ACTION_LEFT] = -1e9
-        if c == grid_size - 1:
-            logits[ACTION_RIGHT] = -1e9
-
-        # PICK only if standing on an object and not holding already
-        on_object = any(tuple(o["pos"]) == (r, c) for o in obs.get("objects", []))
-        if (not on_object) or (obs.get("holding") is not None):
-            logits[ACTION_PICK] = -1e9
-
-        # DROP only if holding something
-        if obs.get("holding") is None:
-            logits[ACTION_DROP] = -1e9
-
-        return int(torch.argmax(logits).item())
+        return mask_logits(logits, obs)
@@ -0,0 +1,328 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from agent.learned_agent import LearnedAgent, mask_logits
+from env.gridworld import GridWorld
+
+
+# GridWorld.reset always places these objects, in this order
+COLORS = GridWorld.COLORS
+UNSET = 255  # table entry that was never filled
+
+
+def _instruction(color: str) -> str:
+    return f"pick up the {color} block"
+
+
+def count_states(size: int, num_colors: int = len(COLORS)) -> int:
+    """
+    Number of reachable (target, holding, agent, objects) states.
+    Holding the target ends the episode, so only the other colors can be held,
+    and a held object always sits on the agent's cell.
+    """
+    cells = size * size
+    per_target = cells ** (num_colors + 1) + (num_colors - 1) * cells ** num_colors
+    return num_colors * per_target
+
+
+class PolicyTable:
+    """
+    Argmax actions for every reachable state of a size x size world.
+
+    The index is dense over exactly the reachable states, in two mixed-radix
+    blocks: first (target, agent cell, object cells...) with nothing held,
+    then (target, held non-target color, agent cell, other object cells...),
+    where the held object's cell is implied by the agent's. A lookup is a
+    handful of multiplies; entries that were never filled stay UNSET.
+
+    The table records the checkpoint sha256 and render config it was compiled
+    from, so TabulatedAgent can refuse to pair it with a different policy.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        colors=COLORS,
+        actions: Optional[np.ndarray] = None,
+        build_seconds: float = 0.0,
+        checkpoint_sha256: Optional[str] = None,
+        render_config: Optional[Dict] = None,
+    ):
+        self.size = size
+        self.colors = tuple(colors)
+        self.cells = size * size
+        k = len(self.colors)
+        self._holding_base = k * self.cells ** (k + 1)
+        self.num_entries = count_states(size, k)
+        if actions is None:
+            actions = np.full(self.num_entries, UNSET, dtype=np.uint8)
+        assert actions.shape == (self.num_entries,), "table does not match size/colors"
+        self.actions = actions
+        self.build_seconds = build_seconds
+        self.checkpoint_sha256 = checkpoint_sha256
+        self.render_config = render_config
+
+        self._target_idx = {_instruction(c): i for i, c in enumerate(self.colors)}
+        self._color_idx = {c: i for i, c in enumerate(self.colors)}
+
+    def encode(self, target: int, held: int, agent_cell: int, object_cells: Sequence[int]) -> int:
+        """`held` is the index of the held color, or -1 for nothing."""
+        k = len(self.colors)
+        if held < 0:
+            idx = target * self.cells + agent_cell
+            for cell in object_cells:
+                idx = idx * self.cells + cell
+            return idx
+
+        # held slot among the k - 1 non-target colors
+        slot = held if held < target else held - 1
+        idx = (target * (k - 1) + slot) * self.cells + agent_cell
+        for i, cell in enumerate(object_cells):
+            if i != held:
+                idx = idx * self.cells + cell
+        return self._holding_base + idx
+
+    def index(self, obs: Dict) -> Optional[int]:
+        """Table index for `obs`, or None if the table doesn't cover it."""
+        target = self._target_idx.get(obs["instruction"])
+        holding = obs.get("holding")
+        held = -1 if holding is None else self._color_idx.get(holding)
+        objects = obs.get("objects", [])
+        # holding the target is terminal, so those states aren't stored
+        if target is None or held is None or held == target or len(objects) != len(self.colors):
+            return None
+
+        object_cells = []
+        for color, o in zip(self.colors, objects):
+            cell = self._cell(o["pos"])
+            if o["color"] != color or cell is None:
+                return None
+            object_cells.append(cell)
+        agent_cell = self._cell(obs["agent_pos"])
+        if agent_cell is None or (held >= 0 and object_cells[held] != agent_cell):
+            return None
+        return self.encode(target, held, agent_cell, object_cells)
+
+    def lookup(self, obs: Dict) -> Optional[int]:
+        idx = self.index(obs)
+        if idx is None:
+            return None
+        action = self.actions[idx]
+        return None if action == UNSET else int(action)
+
+    def matches(self, agent: LearnedAgent) -> bool:
+        """True if this table was compiled from `agent`'s checkpoint and render config."""
+        return (
+            self.checkpoint_sha256 == agent.checkpoint_sha256
+            and self.render_config == asdict(agent.render_config)
+        )
+
+    def _cell(self, pos) -> Optional[int]:
+        r, c = pos
+        if 0 <= r < self.size and 0 <= c < self.size:
+            return int(r) * self.size + int(c)
+        return None
+
+    @property
+    def num_filled(self) -> int:
+        return int(np.count_nonzero(self.actions != UNSET))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.actions.nbytes)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            actions=self.actions,
+            size=self.size,
+            colors=np.array(self.colors),
+            build_seconds=self.build_seconds,
+            checkpoint_sha256=self.checkpoint_sha256 or "",
+            render_config=json.dumps(self.render_config),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PolicyTable":
+        data = np.load(path)
+        return cls(
+            size=int(data["size"]),
+            colors=[str(c) for c in data["colors"]],
+            actions=data["actions"],
+            build_seconds=float(data["build_seconds"]),
+            checkpoint_sha256=str(data["checkpoint_sha256"]) or None,
+            render_config=json.loads(str(data["render_config"])),
+        )
+
+
+def _state(table: PolicyTable, t: int, held: int, agent_cell: int, object_cells: Sequence[int]) -> Dict:
+    size, colors = table.size, table.colors
+
+    def pos(cell):
+        return (cell // size, cell % size)
+
+    return {
+        "instruction": _instruction(colors[t]),
+        "agent_pos": pos(agent_cell),
+        "objects": [{"color": c, "pos": pos(cell)} for c, cell in zip(colors, object_cells)],
+        "holding": None if held < 0 else colors[held],
+    }
+
+
+def iter_states(table: PolicyTable) -> Iterator[Tuple[int, Dict]]:
+    """Yield (table index, obs) for every reachable state the table covers."""
+    k, cells = len(table.colors), table.cells
+    for t in range(k):
+        for held in range(-1, k):
+            if held == t:
+                continue  # holding the target is terminal
+            for agent_cell in range(cells):
+                free = k if held < 0 else k - 1
+                for rest in itertools.product(range(cells), repeat=free):
+                    object_cells = list(rest)
+                    if held >= 0:
+                        object_cells.insert(held, agent_cell)
+                    yield table.encode(t, held, agent_cell, object_cells), _state(table, t, held, agent_cell, object_cells)
+
+
+def sample_states(table: PolicyTable, n: int, seed: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """Yield `n` random (table index, obs) pairs from the states iter_states covers."""
+    rng = np.random.default_rng(seed)
+    k, cells = len(table.colors), table.cells
+    for _ in range(n):
+        t = int(rng.integers(k))
+        held = int(rng.choice([h for h in range(-1, k) if h != t]))
+        agent_cell = int(rng.integers(cells))
+        object_cells = [int(c) for c in rng.integers(cells, size=k)]
+        if held >= 0:
+            object_cells[held] = agent_cell
+        yield table.encode(t, held, agent_cell, object_cells), _state(table, t, held, agent_cell, object_cells)
+
+
+def fill_table(table: PolicyTable, agent: LearnedAgent, states: Iterable[Tuple[int, Dict]], batch_size: int = 256) -> None:
+    batch = []
+    for item in states:
+        batch.append(item)
+        if len(batch) == batch_size:
+            _fill_batch(table, agent, batch)
+            batch = []
+    if batch:
+        _fill_batch(table, agent, batch)
+
+
+def _fill_batch(table: PolicyTable, agent: LearnedAgent, batch) -> None:
+    # The renderer infers grid size from the coords present, so frames in one
+    # batch can differ in shape; run each shape as its own sub-batch.
+    groups = {}
+    for idx, obs in batch:
+        img = agent.obs_to_tensor(obs)
+        groups.setdefault(tuple(img.shape), []).append((idx, obs, img))
+
+    with torch.no_grad():
+        for items in groups.values():
+            imgs = torch.stack([img for _, _, img in items])
+            logits = agent.model.forward_batch(imgs, [obs["instruction"] for _, obs, _ in items])
+            for row, (idx, obs, _) in zip(logits, items):
+                table.actions[idx] = int(torch.argmax(mask_logits(row, obs)).item())
+
+
+def compile_policy_table(
+    agent: LearnedAgent,
+    size: int = 7,
+    colors=COLORS,
+    batch_size: int = 256,
+    max_states: int = 2_000_000,
+) -> PolicyTable:
+    """
+    Run `agent` over every reachable state of a size x size world and keep the
+    masked argmax. Raises ValueError if there are more than `max_states`
+    states; use TabulatedAgent's LRU mode for those configs instead.
+    """
+    n = count_states(size, len(colors))
+    if n > max_states:
+        raise ValueError(f"{size}x{size} world has {n} states, over max_states={max_states}")
+
+    table = PolicyTable(
+        size, colors, checkpoint_sha256=agent.checkpoint_sha256, render_config=asdict(agent.render_config)
+    )
+    t0 = time.perf_counter()
+    fill_table(table, agent, iter_states(table), batch_size=batch_size)
+    table.build_seconds = time.perf_counter() - t0
+    return table
+
+
+def measure_fill_rate(agent: LearnedAgent, size: int = 7, colors=COLORS, n: int = 1024, batch_size: int = 256) -> float:
+    """States/s compile_policy_table would reach with `agent`, from a small sample."""
+    scratch = PolicyTable(size, colors)
+    t0 = time.perf_counter()
+    fill_table(scratch, agent, sample_states(scratch, n), batch_size=batch_size)
+    return n / (time.perf_counter() - t0)
+
+
+def state_key(obs: Dict) -> Tuple:
+    return (
+        obs["instruction"],
+        tuple(obs["agent_pos"]),
+        tuple((o["color"], tuple(o["pos"])) for o in obs.get("objects", [])),
+        obs.get("holding"),
+    )
+
+
+class TabulatedAgent:
+    """
+    Drop-in for LearnedAgent backed by a PolicyTable.
+
+    States the table doesn't cover (other colors, instructions or grid sizes)
+    go to the model. With cache_size > 0 those model calls are memoized in an
+    LRU keyed on the full state, which is the mode to use when the state space
+    is too large to tabulate.
+    """
+
+    def __init__(self, agent: LearnedAgent, table: Optional[PolicyTable] = None, cache_size: int = 0):
+        if table is not None and not table.matches(agent):
+            raise ValueError(
+                f"policy table was compiled from checkpoint {table.checkpoint_sha256} "
+                f"({table.render_config}), but the agent runs {agent.checkpoint_sha256} "
+                f"({asdict(agent.render_config)}); recompile it"
+            )
+        self.agent = agent
+        self.table = table
+        self.cache_size = cache_size
+        self.stats = {"table": 0, "cache": 0, "model": 0}
+        self._cache: "OrderedDict[Tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def act(self, obs: Dict) -> int:
+        if self.table is not None:
+            action = self.table.lookup(obs)
+            if action is not None:
+                self.stats["table"] += 1
+                return action
+
+        if self.cache_size <= 0:
+            self.stats["model"] += 1
+            return self.agent.act(obs)
+
+        key = state_key(obs)
+        with self._lock:
+            action = self._cache.get(key)
+            if action is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache"] += 1
+                return action
+
+        action = self.agent.act(obs)
+        with self._lock:
+            self._cache[key] = action
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.stats["model"] += 1
+        return action
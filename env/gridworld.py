@@ -29,6 +29,9 @@ class GridWorld:
     PICK = 4
     DROP = 5
 
+    # Objects placed by reset(), one of each
+    COLORS = ("red", "blue", "green")
+
     def __init__(
         self,
         size: int = 7,
@@ -54,7 +57,7 @@ class GridWorld:
         self.agent_pos = (self.rng.integers(1, self.size - 1), self.rng.integers(1, self.size - 1))
 
         # Place a few objects with unique colors
-        colors = ["red", "blue", "green"]
+        colors = list(self.COLORS)
         self.objects = []
         taken = {self.agent_pos}
         for c in colors:
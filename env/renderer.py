@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from typing import Dict, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
@@ -16,18 +17,43 @@ COLOR_MAP = {
 }
 
 
+@dataclass(frozen=True)
+class RenderConfig:
+    """
+    render_obs settings. The policy's input resolution depends on these, so
+    they are stored with datasets and checkpoints (see models/policy.py).
+    """
+    cell_px: int = 64
+    pad_px: int = 16
+    header_px: int = 70
+    show_header: bool = True
+
+
+# Named configs for the CLI scripts; "default" is what the demo displays
+RENDER_PRESETS = {
+    "default": RenderConfig(),
+    "noheader": RenderConfig(show_header=False),
+    "small": RenderConfig(cell_px=16, pad_px=4, show_header=False),
+    "tiny": RenderConfig(cell_px=8, pad_px=2, show_header=False),
+}
+
+
 def render_obs(
     obs: Dict,
     cell_px: int = 64,
     pad_px: int = 16,
     header_px: int = 70,
+    show_header: bool = True,
 ) -> Image.Image:
     """
     Renders the env state to an RGB image.
     Layout:
-    - header: instruction + holding
+    - header: instruction + holding (skipped when show_header is False)
     - grid: cells with objects + agent
     """
+    if not show_header:
+        header_px = 0
+
     size = _infer_grid_size(obs)
     w = pad_px * 2 + size * cell_px
     h = pad_px * 2 + header_px + size * cell_px
@@ -36,23 +62,25 @@ def render_obs(
     draw = ImageDraw.Draw(img)
 
     # Header
-    instr = obs.get("instruction", "")
     holding = obs.get("holding", None)
-    header_text = f"instruction: {instr}"
-    holding_text = f"holding: {holding if holding is not None else 'nothing'}"
-    draw.text((pad_px, pad_px), header_text, fill=COLOR_MAP["text"])
-    draw.text((pad_px, pad_px + 28), holding_text, fill=COLOR_MAP["text"])
+    if show_header:
+        instr = obs.get("instruction", "")
+        header_text = f"instruction: {instr}"
+        holding_text = f"holding: {holding if holding is not None else 'nothing'}"
+        draw.text((pad_px, pad_px), header_text, fill=COLOR_MAP["text"])
+        draw.text((pad_px, pad_px + 28), holding_text, fill=COLOR_MAP["text"])
 
     grid_top = pad_px + header_px
     grid_left = pad_px
 
-    # Grid lines
+    # Grid lines (thinner on small cells so they don't swallow the markers)
+    line_w = 2 if cell_px >= 16 else 1
     for r in range(size + 1):
         y = grid_top + r * cell_px
-        draw.line([(grid_left, y), (grid_left + size * cell_px, y)], fill=COLOR_MAP["grid"], width=2)
+        draw.line([(grid_left, y), (grid_left + size * cell_px, y)], fill=COLOR_MAP["grid"], width=line_w)
     for c in range(size + 1):
         x = grid_left + c * cell_px
-        draw.line([(x, grid_top), (x, grid_top + size * cell_px)], fill=COLOR_MAP["grid"], width=2)
+        draw.line([(x, grid_top), (x, grid_top + size * cell_px)], fill=COLOR_MAP["grid"], width=line_w)
 
     # Objects
     for o in obs.get("objects", []):
@@ -93,7 +121,7 @@ def _draw_cell_marker(draw: ImageDraw.ImageDraw, grid_left: int, grid_top: int,
     margin = int(cell_px * 0.18)
     draw.rounded_rectangle(
         [x0 + margin, y0 + margin, x1 - margin, y1 - margin],
-        radius=10,
+        radius=max(1, cell_px // 6),
         fill=rgb,
         outline=None,
     )
@@ -111,7 +139,9 @@ def _draw_agent(draw: ImageDraw.ImageDraw, grid_left: int, grid_top: int, r: int
 
 def _draw_holding_badge(draw: ImageDraw.ImageDraw, grid_left: int, grid_top: int, r: int, c: int, cell_px: int):
     x0, y0, x1, y1 = _cell_bounds(grid_left, grid_top, r, c, cell_px)
-    badge_r = int(cell_px * 0.12)
-    cx = x1 - int(cell_px * 0.22)
-    cy = y0 + int(cell_px * 0.22)
+    # At least 2px and clear of the grid line, so holding stays visible on tiny cells
+    badge_r = max(2, int(cell_px * 0.12))
+    inset = max(int(cell_px * 0.22), badge_r + 2)
+    cx = x1 - inset
+    cy = y0 + inset
     draw.ellipse([cx - badge_r, cy - badge_r, cx + badge_r, cy + badge_r], fill=COLOR_MAP["holding"])
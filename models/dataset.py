@@ -1,26 +1,62 @@
 import json
-from typing import List, Tuple
+import os
+from dataclasses import asdict
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
 import torch
-from torch.utils.data import Dataset
-from env.renderer import render_obs
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+from agent.expert import expert_action
+from env.gridworld import GridWorld
+from env.renderer import RenderConfig, render_obs
+from models.policy import tokenize
+
+
+PICK = 4
+
+
+def image_to_tensor(img):
+    """PIL RGB image -> float C,H,W tensor in [0, 1]."""
+    img = torch.from_numpy(
+        (torch.ByteTensor(torch.ByteStorage.from_buffer(img.tobytes()))
+         .view(img.size[1], img.size[0], 3)
+         .numpy())
+    ).float() / 255.0
+    return img.permute(2, 0, 1)  # C,H,W
+
+
+def _oversample(steps, pick_oversample: int) -> list:
+    # Oversample rare terminal actions like PICK so the policy learns to finish.
+    samples = []
+    for step in steps:
+        samples.append(step)
+        if step.get('action') == PICK:
+            for _ in range(pick_oversample):
+                samples.append(step)
+    return samples
+
+
+def load_demos(path: str) -> Tuple[list, Optional[RenderConfig]]:
+    """
+    Episodes from a generate_demos.py file, plus the render config it was
+    generated for. Older files are a bare list of episodes and have no config.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data, None
+    return data["episodes"], RenderConfig(**data["render_config"])
 
 
 class VLADataset(Dataset):
-    def __init__(self, path: str):
-        with open(path, "r") as f:
-            self.episodes = json.load(f)
+    def __init__(self, path: str, render_config: Optional[RenderConfig] = None, pick_oversample: int = 10):
+        self.episodes, demo_config = load_demos(path)
 
-        self.samples = []
+        # Frames are rendered with this config (the demo file's unless one is
+        # passed in); it is saved with the frame cache and the checkpoint
+        self.render_config = render_config or demo_config or RenderConfig()
 
         # Flatten episodes into (obs, instruction, action) samples.
-        # Oversample rare terminal actions like PICK so the policy learns to finish.
-        self.samples = []
-        for ep in self.episodes:
-            for step in ep:
-                self.samples.append(step)
-                if step.get('action') == 4:  # PICK
-                    for _ in range(10):
-                        self.samples.append(step)
+        self.samples = _oversample((step for ep in self.episodes for step in ep), pick_oversample)
 
     def __len__(self):
         return len(self.samples)
@@ -30,15 +66,187 @@ class VLADataset(Dataset):
         obs = sample["obs"]
 
         # Render image on the fly
-        img = render_obs(obs)
-        img = torch.from_numpy(
-            (torch.ByteTensor(torch.ByteStorage.from_buffer(img.tobytes()))
-             .view(img.size[1], img.size[0], 3)
-             .numpy())
-        ).float() / 255.0
-        img = img.permute(2, 0, 1)  # C,H,W
+        img = image_to_tensor(render_obs(obs, **asdict(self.render_config)))
 
         instruction = obs["instruction"]
         action = sample["action"]
 
-        return img, instruction, torch.tensor(action, dtype=torch.long)
\ No newline at end of file
+        return img, instruction, torch.tensor(action, dtype=torch.long)
+
+
+def build_frame_cache(path: str, cache_dir: str, render_config: Optional[RenderConfig] = None) -> None:
+    """
+    Render every step of the demos in `path` once and store the frames for
+    CachedVLADataset: cache_dir/frames.npy holds all frames back to back as
+    uint8 (shapes differ with the inferred grid size), cache_dir/index.json
+    holds each step's obs, action, episode and where its frame lives.
+    """
+    episodes, demo_config = load_demos(path)
+    render_config = render_config or demo_config or RenderConfig()
+
+    frames = []
+    index = []
+    offset = 0
+    for ep_i, ep in enumerate(episodes):
+        for step in ep:
+            frame = np.asarray(render_obs(step["obs"], **asdict(render_config)), dtype=np.uint8)
+            frames.append(frame.ravel())
+            index.append({
+                "obs": step["obs"],
+                "action": step["action"],
+                "episode": ep_i,
+                "offset": offset,
+                "shape": list(frame.shape),
+            })
+            offset += frame.size
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, "frames.npy"), np.concatenate(frames))
+    with open(os.path.join(cache_dir, "index.json"), "w") as f:
+        json.dump({"source": path, "render_config": asdict(render_config), "samples": index}, f)
+
+
+class CachedVLADataset(Dataset):
+    """
+    VLADataset over frames pre-rendered by build_frame_cache.
+
+    The frame file is memory-mapped read-only, so any number of processes can
+    share one copy through the page cache. `episodes` restricts the dataset
+    to those episode ids (e.g. for a train/val split).
+    """
+
+    def __init__(self, cache_dir: str, pick_oversample: int = 10, episodes: Optional[Iterable[int]] = None):
+        with open(os.path.join(cache_dir, "index.json"), "r") as f:
+            index = json.load(f)
+        self.frames = np.load(os.path.join(cache_dir, "frames.npy"), mmap_mode="r")
+        self.render_config = RenderConfig(**index["render_config"])
+        self.num_episodes = 1 + max(s["episode"] for s in index["samples"])
+
+        steps = index["samples"]
+        if episodes is not None:
+            keep = set(episodes)
+            steps = [s for s in steps if s["episode"] in keep]
+        self.samples = _oversample(steps, pick_oversample)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        sample = self.samples[idx]
+        h, w, c = sample["shape"]
+        start = sample["offset"]
+        frame = np.array(self.frames[start:start + h * w * c]).reshape(h, w, c)
+        img = torch.from_numpy(frame).float() / 255.0
+        img = img.permute(2, 0, 1)  # C,H,W
+
+        return img, sample["obs"]["instruction"], torch.tensor(sample["action"], dtype=torch.long)
+
+
+def instruction_vocab(colors=GridWorld.COLORS) -> dict:
+    """Vocab covering every instruction ExpertStreamDataset can emit."""
+    vocab = {"<unk>": 0}
+    for c in colors:
+        for tok in f"pick up the {c} block".split():
+            if tok not in vocab:
+                vocab[tok] = len(vocab)
+    return vocab
+
+
+MIN_GRID_SIZE = 5  # GridWorld asserts this
+
+
+def _check_worker_config(i: int, cfg: dict) -> None:
+    # Bad configs would otherwise fail (or quietly emit junk) inside a worker
+    unknown = set(cfg) - {"sizes", "colors"}
+    if unknown:
+        raise ValueError(f"worker config {i}: unknown keys {sorted(unknown)}")
+    sizes = cfg.get("sizes", [7])
+    if not isinstance(sizes, list) or not sizes or any(not isinstance(s, int) or s < MIN_GRID_SIZE for s in sizes):
+        raise ValueError(f"worker config {i}: sizes must be integers >= {MIN_GRID_SIZE}, got {sizes}")
+    mix = cfg.get("colors")
+    if mix is None:
+        return
+    if not isinstance(mix, dict) or not mix:
+        raise ValueError(f"worker config {i}: colors must be a non-empty {{color: weight}} dict, got {mix}")
+    unknown = set(mix) - set(GridWorld.COLORS)
+    if unknown:
+        raise ValueError(f"worker config {i}: unknown colors {sorted(unknown)}, expected some of {GridWorld.COLORS}")
+    if any(not isinstance(w, (int, float)) or not w > 0 for w in mix.values()):
+        raise ValueError(f"worker config {i}: color weights must be positive, got {mix}")
+
+
+class ExpertStreamDataset(IterableDataset):
+    """
+    Endless stream of expert (frame, instruction tokens, action) samples,
+    generated by rolling out expert_action in fresh GridWorlds. No demo file
+    is needed, and rendering and tokenizing happen in the DataLoader workers.
+
+    Each worker draws from its own seed stream (derived from `seed` and the
+    worker id) and uses worker_configs[worker_id % len(worker_configs)], a dict
+    with optional keys:
+      "sizes":  grid sizes to sample from (default [7])
+      "colors": {color: weight} mix of target colors (default uniform)
+    Configs are validated on construction (ValueError), not inside the workers.
+
+    Consecutive steps of an episode (and the PICK copies) are near-duplicates,
+    so each worker passes its samples through a shuffle buffer: it fills
+    `shuffle_buffer` slots, then yields a random slot and refills it. Slots
+    hold the rendered uint8 frame; it becomes a float tensor only on the way out.
+    """
+
+    def __init__(
+        self,
+        vocab: dict,
+        render_config: Optional[RenderConfig] = None,
+        seed: int = 0,
+        worker_configs: Optional[List[dict]] = None,
+        pick_oversample: int = 10,
+        max_steps: int = 50,
+        shuffle_buffer: int = 256,
+    ):
+        self.vocab = vocab
+        self.render_config = render_config or RenderConfig()
+        self.seed = seed
+        self.worker_configs = worker_configs or [{}]
+        for i, cfg in enumerate(self.worker_configs):
+            _check_worker_config(i, cfg)
+        self.pick_oversample = pick_oversample
+        self.max_steps = max_steps
+        self.shuffle_buffer = shuffle_buffer
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker_id = 0 if info is None else info.id
+        cfg = self.worker_configs[worker_id % len(self.worker_configs)]
+        sizes = cfg.get("sizes", [7])
+        mix = cfg.get("colors", {c: 1.0 for c in GridWorld.COLORS})
+        colors = list(mix)
+        weights = np.array([mix[c] for c in colors], dtype=np.float64)
+        weights /= weights.sum()
+
+        rng = np.random.default_rng([self.seed, worker_id])
+        capacity = max(1, self.shuffle_buffer)  # 1 keeps episode order
+        buffer = []
+        for sample in self._episodes(rng, sizes, colors, weights):
+            if len(buffer) < capacity:
+                buffer.append(sample)
+                continue
+            i = int(rng.integers(len(buffer)))
+            frame, tokens, action = buffer[i]
+            buffer[i] = sample
+            yield image_to_tensor(frame), tokens, action
+
+    def _episodes(self, rng, sizes, colors, weights):
+        # expert samples in episode order, PICKs repeated
+        while True:
+            env = GridWorld(size=int(rng.choice(sizes)), max_steps=self.max_steps, seed=int(rng.integers(2**31)))
+            obs = env.reset(f"pick up the {rng.choice(colors, p=weights)} block")
+            tokens = tokenize(obs["instruction"], self.vocab)
+            done = False
+            while not done:
+                action = expert_action(env, obs)
+                frame = render_obs(obs, **asdict(self.render_config))
+                sample = (frame, tokens, torch.tensor(action, dtype=torch.long))
+                for _ in range(1 + (self.pick_oversample if action == PICK else 0)):
+                    yield sample
+                obs, _, done, _ = env.step(action)
@@ -1,38 +1,94 @@
+from dataclasses import asdict
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+def tokenize(text: str, vocab: dict):
+    """Instruction -> LongTensor of vocab ids (unknown words map to 0)."""
+    tokens = text.lower().split()
+    return torch.tensor([vocab.get(t, 0) for t in tokens], dtype=torch.long)
+
+
 class TinyVLAPolicy(nn.Module):
-    def __init__(self, vocab: dict, num_actions: int = 6):
+    def __init__(
+        self,
+        vocab: dict,
+        num_actions: int = 6,
+        conv_channels=(16, 32),
+        text_dim: int = 16,
+        hidden_dim: int = 64,
+    ):
         super().__init__()
         self.vocab = vocab
+        # Saved with checkpoints so the same architecture can be rebuilt
+        self.model_config = {
+            "conv_channels": list(conv_channels),
+            "text_dim": text_dim,
+            "hidden_dim": hidden_dim,
+        }
+        c1, c2 = conv_channels
 
         self.conv = nn.Sequential(
-            nn.Conv2d(3, 16, 3, stride=2),
+            nn.Conv2d(3, c1, 3, stride=2),
             nn.ReLU(),
-            nn.Conv2d(16, 32, 3, stride=2),
+            nn.Conv2d(c1, c2, 3, stride=2),
             nn.ReLU(),
             nn.AdaptiveAvgPool2d((1, 1)),
         )
 
-        self.text_embed = nn.Embedding(len(vocab), 16)
+        self.text_embed = nn.Embedding(len(vocab), text_dim)
 
         self.fc = nn.Sequential(
-            nn.Linear(32 + 16, 64),
+            nn.Linear(c2 + text_dim, hidden_dim),
             nn.ReLU(),
-            nn.Linear(64, num_actions),
+            nn.Linear(hidden_dim, num_actions),
         )
 
-    def encode_text(self, text: str):
-        tokens = text.lower().split()
-        idxs = [self.vocab.get(t, 0) for t in tokens]
-        t = torch.tensor(idxs, dtype=torch.long)
+    def encode_text(self, text):
+        # Accepts a raw instruction or ids already produced by tokenize()
+        t = text if torch.is_tensor(text) else tokenize(text, self.vocab)
         emb = self.text_embed(t)
         return emb.mean(dim=0)
 
-    def forward(self, img, instruction: str):
+    def forward(self, img, instruction):
         img_feat = self.conv(img.unsqueeze(0)).view(-1)
         txt_feat = self.encode_text(instruction)
         feat = torch.cat([img_feat, txt_feat], dim=0)
         return self.fc(feat)
+
+    def forward_batch(self, imgs, instructions):
+        """Batched forward: imgs is (B, C, H, W), one instruction per image."""
+        img_feat = self.conv(imgs).flatten(1)
+        txt_feat = torch.stack([self.encode_text(t) for t in instructions])
+        feat = torch.cat([img_feat, txt_feat], dim=1)
+        return self.fc(feat)
+
+
+def save_checkpoint(path: str, model: TinyVLAPolicy, render_config) -> None:
+    """
+    Save weights together with what's needed to rebuild the model and its
+    inputs: the architecture, the vocab and the RenderConfig it was trained on.
+    """
+    torch.save(
+        {
+            "state_dict": model.state_dict(),
+            "model_config": model.model_config,
+            "vocab": dict(model.vocab),
+            "render_config": asdict(render_config),
+        },
+        path,
+    )
+
+
+def load_checkpoint(path: str):
+    """
+    Returns (state_dict, meta). Older checkpoints are a bare state_dict;
+    those come back with empty meta.
+    """
+    ckpt = torch.load(path, map_location="cpu")
+    if "state_dict" in ckpt:
+        meta = {k: v for k, v in ckpt.items() if k != "state_dict"}
+        return ckpt["state_dict"], meta
+    return ckpt, {}
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict
+
+import numpy as np
+import torch
+
+from agent.learned_agent import LearnedAgent
+from env.gridworld import GridWorld
+from env.renderer import RENDER_PRESETS, render_obs
+from models.dataset import VLADataset
+from models.policy import save_checkpoint
+from scripts.generate_demos import run_episode
+from scripts.train_policy import build_vocab, train
+
+
+def holding_badge_pixels(presets):
+    """
+    Pixels that differ between holding and not holding an object, per preset.
+    Raises if any preset renders the two identically: a policy trained at that
+    resolution could never tell whether its PICK worked.
+    """
+    obs = {
+        "instruction": "pick up the red block",
+        "agent_pos": (3, 3),
+        "objects": [
+            {"color": "red", "pos": (0, 0)},
+            {"color": "blue", "pos": (3, 3)},
+            {"color": "green", "pos": (6, 6)},
+        ],
+        "holding": None,
+    }
+    diff = {}
+    for name in presets:
+        cfg = asdict(RENDER_PRESETS[name])
+        empty = np.asarray(render_obs(obs, **cfg))
+        holding = np.asarray(render_obs({**obs, "holding": "blue"}, **cfg))
+        diff[name] = int((empty != holding).any(axis=-1).sum())
+    invisible = [name for name, n in diff.items() if n == 0]
+    if invisible:
+        raise ValueError(f"holding is invisible at render presets {invisible}")
+    return diff
+
+
+def majority_baseline(episodes):
+    """Agreement of always answering the expert's most common action."""
+    counts = Counter(s["action"] for ep in episodes for s in ep)
+    return counts.most_common(1)[0][1] / sum(counts.values())
+
+
+def eval_agreement(agent, episodes):
+    """Fraction of held-out expert steps where the policy picks the expert's action."""
+    steps = [s for ep in episodes for s in ep]
+    hits = sum(agent.act(s["obs"]) == s["action"] for s in steps)
+    return hits / len(steps)
+
+
+def eval_success(agent, n_episodes, seed):
+    # Plain policy rollouts, without the webapp's expert fallback
+    env = GridWorld(size=7, seed=seed)
+    successes = 0
+    for _ in range(n_episodes):
+        obs = env.reset()
+        done = False
+        while not done:
+            obs, reward, done, info = env.step(agent.act(obs))
+        successes += reward >= 1.0
+    return successes / n_episodes
+
+
+def time_act(agent, episodes, repeats=3):
+    obs = [s["obs"] for ep in episodes for s in ep]
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for o in obs:
+            agent.act(o)
+    return (time.perf_counter() - t0) / (repeats * len(obs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed/accuracy of the policy across observation resolutions")
+    parser.add_argument("--data", help="train on these demos instead of generating --train-episodes")
+    parser.add_argument("--train-episodes", type=int, default=300,
+                        help="expert episodes to train on; the 20 stock demos are too few to beat the baseline")
+    parser.add_argument("--presets", nargs="+", choices=sorted(RENDER_PRESETS), default=list(RENDER_PRESETS))
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--eval-episodes", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    # Held-out expert episodes from a seed the training demos didn't use
+    eval_env = GridWorld(size=7, seed=10_000 + args.seed)
+    eval_episodes = [run_episode(eval_env) for _ in range(args.eval_episodes)]
+
+    badge_px = holding_badge_pixels(args.presets)
+    print("holding badge pixels:", ", ".join(f"{name} {n}" for name, n in badge_px.items()))
+    baseline = majority_baseline(eval_episodes)
+    print(f"majority-action baseline agreement {baseline:.3f}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data = args.data
+        if data is None:
+            train_env = GridWorld(size=7, seed=args.seed)
+            data = os.path.join(tmp, "demos.json")
+            with open(data, "w") as f:
+                json.dump([run_episode(train_env) for _ in range(args.train_episodes)], f)
+
+        for name in args.presets:
+            cfg = RENDER_PRESETS[name]
+            torch.manual_seed(args.seed)
+
+            dataset = VLADataset(data, render_config=cfg)
+            vocab = build_vocab(dataset)
+            t0 = time.perf_counter()
+            model = train(dataset, vocab, epochs=args.epochs, verbose=False)
+            train_s = time.perf_counter() - t0
+
+            # Round-trip through a checkpoint so the agent picks up the config itself
+            path = os.path.join(tmp, f"{name}.pt")
+            save_checkpoint(path, model, cfg)
+            agent = LearnedAgent(checkpoint_path=path)
+
+            w, h = render_obs(eval_episodes[0][0]["obs"], **asdict(agent.render_config)).size
+            row = {
+                "preset": name,
+                "render_config": asdict(cfg),
+                "image": f"{w}x{h}",
+                "holding_badge_px": badge_px[name],
+                "train_s": round(train_s, 2),
+                "act_ms": round(1000 * time_act(agent, eval_episodes), 3),
+                "agreement": round(eval_agreement(agent, eval_episodes), 3),
+                "success": round(eval_success(agent, args.eval_episodes, seed=20_000 + args.seed), 3),
+                "majority_baseline": round(baseline, 3),
+            }
+            results.append(row)
+            print(
+                f"{name:>8}  {row['image']:>9}  train {row['train_s']:7.2f}s  "
+                f"act {row['act_ms']:7.3f}ms  agreement {row['agreement']:.3f}  success {row['success']:.3f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+
+from agent.learned_agent import LearnedAgent
+from agent.tabulated_agent import compile_policy_table, count_states, measure_fill_rate
+from scripts.run_learned_agent import build_vocab_from_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile policy.pt into a lookup table over GridWorld states",
+        epilog="Build time is dominated by rendering, so it depends on the render config the checkpoint "
+               "was trained at: the default 7x7 world (18,000,297 states) needs --max-states 18000297 and "
+               "is practical for a policy trained with `train_policy.py --render tiny` (1-2h at 3-5k "
+               "states/s on one core), not at the default render (~100 states/s). The script measures the "
+               "rate for your checkpoint and prints an estimate before building.",
+    )
+    parser.add_argument("--size", type=int, default=7)
+    parser.add_argument("--checkpoint", default="policy.pt")
+    parser.add_argument("--out", default="policy_table.npz")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-states", type=int, default=2_000_000,
+                        help="refuse to build tables with more states than this")
+    args = parser.parse_args()
+
+    agent = LearnedAgent(
+        lambda: build_vocab_from_dataset("data/demo_trajectories.json"), checkpoint_path=args.checkpoint
+    )
+
+    n = count_states(args.size)
+    rate = measure_fill_rate(agent, size=args.size, batch_size=args.batch_size)
+    print(f"{args.size}x{args.size} world: {n} reachable states ({n / 1e6:.1f} MB table)")
+    print(f"render {agent.render_config}: ~{rate:.0f} states/s, estimated build {n / rate / 60:.1f} min")
+    if n > args.max_states:
+        # non-zero so a chained build step doesn't go on with a missing or stale --out
+        parser.exit(2, f"over --max-states={args.max_states}; pass --max-states {n} to build it anyway, or use "
+                       f"run_learned_agent.py --cache-size N for LRU memoization instead\n")
+
+    table = compile_policy_table(
+        agent, size=args.size, batch_size=args.batch_size, max_states=args.max_states
+    )
+    table.save(args.out)
+
+    print(f"filled {table.num_filled}/{table.num_entries} entries ({table.nbytes / 1e6:.1f} MB)")
+    print(f"build time {table.build_seconds:.1f}s ({table.num_filled / table.build_seconds:.0f} states/s)")
+    print(f"saved {args.out} (checkpoint sha256 {table.checkpoint_sha256[:12]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
+import argparse
 import json
+from dataclasses import asdict
 from env.gridworld import GridWorld
 from agent.expert import expert_action
-from env.renderer import render_obs
+from env.renderer import RENDER_PRESETS, render_obs
 
 
 def run_episode(env: GridWorld):
@@ -25,21 +27,29 @@ def run_episode(env: GridWorld):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Record expert demos for behavior cloning")
+    parser.add_argument("--out", default="data/demo_trajectories.json")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--render", choices=sorted(RENDER_PRESETS), default="default",
+                        help="render preset datasets built from these demos use unless told otherwise")
+    args = parser.parse_args()
+    render_config = RENDER_PRESETS[args.render]
+
     env = GridWorld(size=7, seed=0)
     demos = []
 
-    for _ in range(20):
+    for _ in range(args.episodes):
         traj = run_episode(env)
         demos.append(traj)
 
-    with open("data/demo_trajectories.json", "w") as f:
-        json.dump(demos, f, indent=2)
+    with open(args.out, "w") as f:
+        json.dump({"render_config": asdict(render_config), "episodes": demos}, f, indent=2)
 
     # Render last frame for sanity check
-    img = render_obs(obs=traj[-1]["obs"])
+    img = render_obs(obs=traj[-1]["obs"], **asdict(render_config))
     img.save("demo_last_frame.png")
 
-    print(f"Saved {len(demos)} trajectories to data/demo_trajectories.json")
+    print(f"Saved {len(demos)} trajectories to {args.out} (render {render_config})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+"""
+Load-test the demo webapp's /api/reset and /api/step.
+
+Each simulated client loops: reset, then step until the episode is done (or
+--steps-per-episode), until --duration runs out. Two ways to reach the app:
+
+  python -m scripts.load_test --clients 16 --duration 30
+      in-process, straight through the ASGI app (no sockets)
+
+  python -m scripts.load_test --url http://127.0.0.1:8000 --clients 16
+  python -m scripts.load_test --spawn --clients 16
+      over HTTP against a running uvicorn, or one started on a free port
+
+Only the stdlib is used on the client side, so it runs offline on one box.
+Results (throughput, p50/p95/p99 latency, error rate, response size per
+endpoint) are printed and saved as JSON for comparison across server changes.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+ENDPOINTS = ("/api/reset", "/api/step")
+
+
+class Recorder:
+    """Collects (endpoint, latency, ok, bytes) samples from all clients."""
+
+    def __init__(self):
+        self.samples = {ep: [] for ep in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, latency_s, ok, nbytes):
+        with self._lock:
+            self.samples[endpoint].append((latency_s, ok, nbytes))
+
+
+def percentile(sorted_vals, q):
+    # nearest-rank
+    if not sorted_vals:
+        return None
+    k = max(0, math.ceil(q / 100.0 * len(sorted_vals)) - 1)
+    return sorted_vals[k]
+
+
+def summarize(recorder, wall_s):
+    out = {}
+    for ep, samples in recorder.samples.items():
+        lat = sorted(s[0] * 1000.0 for s in samples)
+        errors = sum(1 for s in samples if not s[1])
+        sizes = [s[2] for s in samples if s[1]]
+        n = len(samples)
+        out[ep] = {
+            "requests": n,
+            "errors": errors,
+            "error_rate": errors / n if n else 0.0,
+            "throughput_rps": n / wall_s if wall_s > 0 else 0.0,
+            "latency_ms": {
+                "mean": sum(lat) / n if n else None,
+                "p50": percentile(lat, 50),
+                "p95": percentile(lat, 95),
+                "p99": percentile(lat, 99),
+                "max": lat[-1] if lat else None,
+            },
+            "response_bytes": {
+                "mean": sum(sizes) / len(sizes) if sizes else None,
+                "total": sum(sizes),
+            },
+        }
+    return out
+
+
+def _episode_done(ok, body):
+    if not ok:
+        return False
+    try:
+        return bool(json.loads(body).get("done"))
+    except ValueError:
+        return False
+
+
+# ---- HTTP mode --------------------------------------------------------------
+
+def http_client(host, port, base_path, deadline, steps_per_episode, recorder, timeout):
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def post(path):
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", base_path + path, body=b"", headers={"Content-Length": "0"})
+            resp = conn.getresponse()
+            body = resp.read()
+            ok = resp.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()  # reconnects on the next request
+            body, ok = b"", False
+        recorder.add(path, time.perf_counter() - t0, ok, len(body))
+        return ok, body
+
+    while time.perf_counter() < deadline:
+        post("/api/reset")
+        for _ in range(steps_per_episode):
+            if time.perf_counter() >= deadline:
+                break
+            if _episode_done(*post("/api/step")):
+                break
+    conn.close()
+
+
+def run_http(url, clients, duration, steps_per_episode, timeout):
+    u = urlparse(url)
+    host, port = u.hostname, u.port or 80
+    base_path = u.path.rstrip("/")  # app mounted under a prefix, e.g. behind a proxy
+
+    # warm-up: the first request pays for the model load
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        for path in ENDPOINTS:
+            conn.request("POST", base_path + path, body=b"", headers={"Content-Length": "0"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                raise SystemExit(f"warm-up POST {url.rstrip('/')}{path} returned HTTP {resp.status}")
+    except (OSError, http.client.HTTPException) as e:
+        raise SystemExit(f"could not reach {url} ({e}); is the server running?")
+    finally:
+        conn.close()
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(target=http_client, args=(host, port, base_path, deadline, steps_per_episode, recorder, timeout))
+        for _ in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, time.perf_counter() - start
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port, startup_timeout=120.0):
+    env = dict(os.environ, VLA_WATCH_INTERVAL="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "webapp.server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    t_end = time.perf_counter() + startup_timeout
+    while time.perf_counter() < t_end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start in time")
+
+
+# ---- in-process ASGI mode ---------------------------------------------------
+
+async def asgi_post(app, path):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"loadtest"), (b"content-length", b"0")],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80),
+    }
+    sent = False
+    status = 500
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the client never disconnects; park until the app is done with us
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def asgi_client(app, deadline, steps_per_episode, recorder):
+    async def post(path):
+        t0 = time.perf_counter()
+        try:
+            status, body = await asgi_post(app, path)
+            ok = status < 400
+        except Exception:
+            body, ok = b"", False
+        recorder.add(path, time.perf_counter() - t0, ok, len(body))
+        return ok, body
+
+    while time.perf_counter() < deadline:
+        await post("/api/reset")
+        for _ in range(steps_per_episode):
+            if time.perf_counter() >= deadline:
+                break
+            if _episode_done(*await post("/api/step")):
+                break
+
+
+async def _run_asgi(clients, duration, steps_per_episode):
+    os.environ.setdefault("VLA_WATCH_INTERVAL", "0")
+    from webapp.server import app
+
+    for path in ENDPOINTS:  # warm-up: model load
+        await asgi_post(app, path)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(asgi_client(app, deadline, steps_per_episode, recorder) for _ in range(clients)))
+    return recorder, time.perf_counter() - start
+
+
+def run_asgi(clients, duration, steps_per_episode):
+    return asyncio.run(_run_asgi(clients, duration, steps_per_episode))
+
+
+# ---- main -------------------------------------------------------------------
+
+def _git_rev():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _ms(v):
+    return f"{v:8.1f}" if v is not None else f"{'-':>8}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /api/reset and /api/step")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="base URL of a running server (HTTP mode)")
+    target.add_argument("--spawn", action="store_true", help="start uvicorn on a free local port (HTTP mode)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--steps-per-episode", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (HTTP mode)")
+    parser.add_argument("--out", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    proc = None
+    try:
+        if args.spawn:
+            port = _free_port()
+            proc = spawn_server(port)
+            args.url = f"http://127.0.0.1:{port}"
+        if args.url:
+            mode = "http"
+            recorder, wall_s = run_http(args.url, args.clients, args.duration, args.steps_per_episode, args.timeout)
+        else:
+            mode = "asgi"
+            recorder, wall_s = run_asgi(args.clients, args.duration, args.steps_per_episode)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_rev": _git_rev(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {
+            "mode": mode,
+            "url": args.url,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "steps_per_episode": args.steps_per_episode,
+        },
+        "wall_s": wall_s,
+        "endpoints": summarize(recorder, wall_s),
+    }
+
+    print(f"{mode} mode, {args.clients} clients, {wall_s:.1f}s")
+    print(f"{'endpoint':<12} {'reqs':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6} {'avg KB':>7}")
+    for ep, r in results["endpoints"].items():
+        lat = r["latency_ms"]
+        size = r["response_bytes"]["mean"]
+        print(
+            f"{ep:<12} {r['requests']:>6} {r['throughput_rps']:>8.1f} {_ms(lat['p50'])} {_ms(lat['p95'])} "
+            f"{_ms(lat['p99'])} {100 * r['error_rate']:>6.2f} {(size or 0) / 1024:>7.1f}"
+        )
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
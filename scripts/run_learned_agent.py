@@ -1,7 +1,9 @@
+import argparse
 import os
 from env.gridworld import GridWorld
 from env.renderer import render_obs
 from agent.learned_agent import LearnedAgent
+from agent.tabulated_agent import PolicyTable, TabulatedAgent
 from models.dataset import VLADataset
 
 ACTION_NAMES = {
@@ -23,10 +25,24 @@ def build_vocab_from_dataset(path):
     return vocab
 
 def main():
+    parser = argparse.ArgumentParser(description="Roll out policy.pt in a 7x7 world")
+    parser.add_argument("--checkpoint", default="policy.pt")
+    parser.add_argument("--table", help="policy table from compile_policy_table.py to look actions up in")
+    parser.add_argument("--cache-size", type=int, default=0, help="memoize model calls in an LRU of this size")
+    args = parser.parse_args()
+
     os.makedirs("rollout_frames", exist_ok=True)
 
     vocab = build_vocab_from_dataset("data/demo_trajectories.json")
-    agent = LearnedAgent(vocab, checkpoint_path="policy.pt")
+    agent = LearnedAgent(vocab, checkpoint_path=args.checkpoint)
+    if args.table or args.cache_size:
+        table = PolicyTable.load(args.table) if args.table else None
+        if table is not None and table.size != 7:
+            print(f"note: {args.table} covers {table.size}x{table.size} worlds; this rollout is 7x7")
+        try:
+            agent = TabulatedAgent(agent, table=table, cache_size=args.cache_size)
+        except ValueError as e:  # table compiled from another checkpoint or render config
+            parser.error(str(e))
 
     env = GridWorld(size=7, seed=123)
     obs = env.reset("pick up the green block")
@@ -60,6 +76,8 @@ def main():
             print("DONE:", info)
             break
 
+    if isinstance(agent, TabulatedAgent):
+        print("actions from:", agent.stats)
     print("finished rollout")
 
 if __name__ == "__main__":
@@ -0,0 +1,284 @@
+"""
+Hyperparameter sweep for TinyVLAPolicy.
+
+The demos are rendered once into a frame cache that every trial memory-maps
+read-only. Trials run in worker processes pinned to disjoint CPU sets, each
+with its own torch thread count. A median stopping rule ends trials whose
+validation loss trails the others after a grace period. Every trial leaves
+policy.pt + metrics.json under the sweep directory, and --promote copies the
+best checkpoint to ./policy.pt (which the webapp picks up on its own).
+
+  python -m scripts.sweep --workers 4
+  python -m scripts.sweep --mode random --trials 20 --space space.json --promote
+
+A space file maps each parameter to a list of choices, or for random search
+to {"uniform": [lo, hi]}, {"log_uniform": [lo, hi]} or {"int": [lo, hi]}.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import torch
+
+from env.renderer import RENDER_PRESETS
+from models.dataset import CachedVLADataset, build_frame_cache
+from models.policy import save_checkpoint
+from scripts.train_policy import build_vocab, train
+
+
+DEFAULT_SPACE = {
+    "lr": [3e-4, 1e-3, 3e-3],
+    "epochs": [5],
+    "conv_channels": [[16, 32], [32, 64]],
+    "text_dim": [16],
+    "hidden_dim": [64, 128],
+    "pick_oversample": [5, 10],
+}
+
+MODEL_KEYS = ("conv_channels", "text_dim", "hidden_dim")
+
+
+def grid_trials(space):
+    keys = sorted(space)
+    for values in itertools.product(*(space[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def random_trials(space, n, seed):
+    rng = random.Random(seed)
+
+    def sample(spec):
+        if isinstance(spec, list):
+            return rng.choice(spec)
+        (kind, (lo, hi)), = spec.items()
+        if kind == "uniform":
+            return rng.uniform(lo, hi)
+        if kind == "log_uniform":
+            return math.exp(rng.uniform(math.log(lo), math.log(hi)))
+        if kind == "int":
+            return rng.randint(lo, hi)
+        raise ValueError(f"unknown search spec {spec}")
+
+    for _ in range(n):
+        yield {k: sample(spec) for k, spec in sorted(space.items())}
+
+
+# ---- worker side ------------------------------------------------------------
+
+_BOARD = None  # shared list of (epoch, val_loss) from every trial
+
+
+def _init_worker(core_sets, threads, board):
+    global _BOARD
+    _BOARD = board
+    cores = core_sets.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads or len(cores))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed once torch has done parallel work
+
+
+def evaluate(model, dataset):
+    """Mean cross-entropy and action accuracy over `dataset`."""
+    model.eval()
+    total_loss, hits = 0.0, 0
+    with torch.no_grad():
+        for i in range(len(dataset)):
+            img, instr, action = dataset[i]
+            logits = model(img, instr)
+            total_loss += torch.nn.functional.cross_entropy(logits.unsqueeze(0), action.unsqueeze(0)).item()
+            hits += int(torch.argmax(logits).item() == action.item())
+    model.train()
+    return total_loss / len(dataset), hits / len(dataset)
+
+
+def run_trial(trial_id, params, cache_dir, trial_dir, val_episodes, grace_epochs, min_peers, seed):
+    torch.manual_seed(seed + trial_id)
+    t0 = time.perf_counter()
+
+    full = CachedVLADataset(cache_dir, pick_oversample=0)
+    n_train = full.num_episodes - val_episodes
+    train_ds = CachedVLADataset(cache_dir, pick_oversample=params["pick_oversample"], episodes=range(n_train))
+    val_ds = CachedVLADataset(cache_dir, pick_oversample=0, episodes=range(n_train, full.num_episodes))
+    vocab = build_vocab(full)
+
+    history = []
+    stopped_early = False
+
+    def on_epoch(epoch, train_loss, model):
+        nonlocal stopped_early
+        val_loss, val_acc = evaluate(model, val_ds)
+        history.append({"epoch": epoch, "train_loss": train_loss, "val_loss": val_loss, "val_acc": val_acc})
+        if not math.isfinite(train_loss):
+            stopped_early = True
+            return False
+
+        # Median stopping rule against every other trial's same epoch
+        peers = [v for e, v in list(_BOARD) if e == epoch]
+        _BOARD.append((epoch, val_loss))
+        if epoch + 1 >= grace_epochs and len(peers) >= min_peers and val_loss > statistics.median(peers):
+            stopped_early = True
+            return False
+        return True
+
+    model = train(
+        train_ds,
+        vocab,
+        epochs=params["epochs"],
+        lr=params["lr"],
+        verbose=False,
+        model_kwargs={k: params[k] for k in MODEL_KEYS if k in params},
+        on_epoch=on_epoch,
+    )
+
+    os.makedirs(trial_dir, exist_ok=True)
+    checkpoint = os.path.join(trial_dir, "policy.pt")
+    save_checkpoint(checkpoint, model, train_ds.render_config)
+
+    last = history[-1]
+    metrics = {
+        "trial": trial_id,
+        "params": params,
+        "val_acc": last["val_acc"],
+        "val_loss": last["val_loss"],
+        "epochs_run": len(history),
+        "stopped_early": stopped_early,
+        "train_s": round(time.perf_counter() - t0, 2),
+        "cores": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+        "checkpoint": checkpoint,
+        "history": history,
+    }
+    with open(os.path.join(trial_dir, "metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2)
+    return metrics
+
+
+# ---- driver -----------------------------------------------------------------
+
+def _core_sets(workers):
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers, len(cores)))
+    # disjoint, near-equal slices
+    return [cores[i::workers] for i in range(workers)]
+
+
+def _rank(results):
+    return sorted(results, key=lambda m: (-m["val_acc"], m["val_loss"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for TinyVLAPolicy")
+    parser.add_argument("--data", default="data/demo_trajectories.json")
+    parser.add_argument("--render", choices=sorted(RENDER_PRESETS),
+                        help="render preset (default: the one recorded in --data)")
+    parser.add_argument("--space", help="JSON search space (default: DEFAULT_SPACE)")
+    parser.add_argument("--mode", choices=("grid", "random"), default="grid")
+    parser.add_argument("--trials", type=int, default=16, help="number of trials for random search")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads-per-trial", type=int, help="torch threads per trial (default: cores per worker)")
+    parser.add_argument("--val-episodes", type=int, default=4)
+    parser.add_argument("--grace-epochs", type=int, default=2, help="epochs before early stopping may kick in")
+    parser.add_argument("--min-peers", type=int, default=3, help="trials needed at an epoch to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", help="default: sweeps/<timestamp>")
+    parser.add_argument("--promote", action="store_true", help="copy the best checkpoint to ./policy.pt")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, "r") as f:
+            space = {**DEFAULT_SPACE, **json.load(f)}
+    if args.mode == "grid":
+        trials = list(grid_trials(space))
+    else:
+        trials = list(random_trials(space, args.trials, args.seed))
+
+    out_dir = args.out_dir or os.path.join("sweeps", datetime.now().strftime("%Y%m%d-%H%M%S"))
+    cache_dir = os.path.join(out_dir, "cache")
+    render_config = RENDER_PRESETS[args.render] if args.render else None
+    t0 = time.perf_counter()
+    build_frame_cache(args.data, cache_dir, render_config)
+    print(f"rendered frame cache in {time.perf_counter() - t0:.1f}s -> {cache_dir}")
+    num_episodes = CachedVLADataset(cache_dir, pick_oversample=0).num_episodes
+    if not 1 <= args.val_episodes < num_episodes:
+        parser.error(f"--val-episodes must be between 1 and {num_episodes - 1} ({args.data} has {num_episodes} episodes)")
+
+    core_sets = _core_sets(args.workers)
+    print(f"{len(trials)} trials on {len(core_sets)} workers, cores {core_sets}")
+
+    ctx = mp.get_context("spawn")
+    results, failures = [], []
+    with ctx.Manager() as manager:
+        core_queue = manager.Queue()
+        for cores in core_sets:
+            core_queue.put(cores)
+        board = manager.list()
+
+        with ProcessPoolExecutor(
+            max_workers=len(core_sets),
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(core_queue, args.threads_per_trial, board),
+        ) as pool:
+            futures = {
+                pool.submit(
+                    run_trial,
+                    i,
+                    params,
+                    cache_dir,
+                    os.path.join(out_dir, f"trial_{i:03d}"),
+                    args.val_episodes,
+                    args.grace_epochs,
+                    args.min_peers,
+                    args.seed,
+                ): (i, params)
+                for i, params in enumerate(trials)
+            }
+            for fut in as_completed(futures):
+                i, params = futures[fut]
+                try:
+                    m = fut.result()
+                except Exception as e:
+                    failures.append({"trial": i, "params": params, "error": repr(e)})
+                    print(f"trial {i:03d} failed: {e!r}")
+                    continue
+                results.append(m)
+                flag = " (stopped early)" if m["stopped_early"] else ""
+                print(f"trial {i:03d} val_acc {m['val_acc']:.3f} val_loss {m['val_loss']:.3f} "
+                      f"{m['epochs_run']} epochs {m['train_s']:.1f}s{flag}")
+
+    ranked = _rank(results)
+    print()
+    print(f"{'rank':>4} {'trial':>5} {'val_acc':>7} {'val_loss':>8} {'epochs':>6}  params")
+    for r, m in enumerate(ranked, 1):
+        early = "*" if m["stopped_early"] else " "
+        print(f"{r:>4} {m['trial']:>5} {m['val_acc']:>7.3f} {m['val_loss']:>8.3f} {m['epochs_run']:>5}{early}  "
+              f"{json.dumps(m['params'])}")
+
+    with open(os.path.join(out_dir, "results.json"), "w") as f:
+        json.dump({"space": space, "mode": args.mode, "ranked": ranked, "failed": failures}, f, indent=2)
+    print(f"saved {os.path.join(out_dir, 'results.json')}")
+
+    if args.promote and ranked:
+        best = ranked[0]
+        # copy then rename so a watching webapp never sees a half-written file
+        tmp = "policy.pt.tmp"
+        shutil.copyfile(best["checkpoint"], tmp)
+        os.replace(tmp, "policy.pt")
+        print(f"promoted trial {best['trial']} -> policy.pt")
+
+
+if __name__ == "__main__":
+    main()
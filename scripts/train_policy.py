@@ -1,29 +1,37 @@
+import argparse
+import json
+import time
+from dataclasses import replace
+
 import torch
 from torch.utils.data import DataLoader
 import torch.optim as optim
-from models.dataset import VLADataset
-from models.policy import TinyVLAPolicy
+from env.renderer import RENDER_PRESETS, RenderConfig
+from models.dataset import ExpertStreamDataset, VLADataset, instruction_vocab
+from models.policy import TinyVLAPolicy, save_checkpoint
 
 
 def build_vocab(dataset):
+    # Only the instructions matter here, so skip rendering every frame
     vocab = {"<unk>": 0}
-    for img, instr, act in dataset:
-        for tok in instr.lower().split():
+    for sample in dataset.samples:
+        for tok in sample["obs"]["instruction"].lower().split():
             if tok not in vocab:
                 vocab[tok] = len(vocab)
     return vocab
 
 
-def main():
-    dataset = VLADataset("data/demo_trajectories.json")
-    vocab = build_vocab(dataset)
-
-    model = TinyVLAPolicy(vocab)
-    optimizer = optim.Adam(model.parameters(), lr=1e-3)
+def train(dataset, vocab, epochs: int = 5, lr: float = 1e-3, verbose: bool = True, model_kwargs=None, on_epoch=None):
+    """
+    Behavior-clone a TinyVLAPolicy on `dataset`. `on_epoch(epoch, mean_loss,
+    model)` runs after every epoch; returning False stops training early.
+    """
+    model = TinyVLAPolicy(vocab, **(model_kwargs or {}))
+    optimizer = optim.Adam(model.parameters(), lr=lr)
 
     loader = DataLoader(dataset, batch_size=1, shuffle=True)
 
-    for epoch in range(5):
+    for epoch in range(epochs):
         total_loss = 0.0
         for img, instr, action in loader:
             logits = model(img[0], instr[0])
@@ -37,10 +45,123 @@ def main():
 
             total_loss += loss.item()
 
-        print(f"epoch {epoch} loss {total_loss:.3f}")
+        if verbose:
+            print(f"epoch {epoch} loss {total_loss:.3f}")
+        if on_epoch is not None and on_epoch(epoch, total_loss / len(loader), model) is False:
+            break
+
+    return model
+
+
+def train_stream(dataset, vocab, steps: int, lr: float = 1e-3, num_workers: int = 2, log_every: int = 500,
+                 model_kwargs=None):
+    """
+    Train for a fixed number of steps on an endless stream (ExpertStreamDataset).
+    Logs throughput and the share of wall time spent waiting on the loader, which
+    should stay near zero if generation keeps up.
+    """
+    model = TinyVLAPolicy(vocab, **(model_kwargs or {}))
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+
+    loader = DataLoader(dataset, batch_size=1, num_workers=num_workers)
+    batches = iter(loader)
+
+    t_start = t_log = time.perf_counter()
+    wait_s = total_wait_s = 0.0
+    total_loss = 0.0
+    n = 0
+    for step in range(1, steps + 1):
+        t0 = time.perf_counter()
+        img, tokens, action = next(batches)
+        wait_s += time.perf_counter() - t0
+
+        logits = model(img[0], tokens[0])
+        loss = torch.nn.functional.cross_entropy(
+            logits.unsqueeze(0), action
+        )
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        total_loss += loss.item()
+        n += 1
+        if step % log_every == 0 or step == steps:
+            elapsed = time.perf_counter() - t_log
+            print(
+                f"step {step} loss {total_loss / n:.3f} "
+                f"{n / elapsed:.1f} samples/s, data wait {100 * wait_s / elapsed:.0f}%"
+            )
+            total_wait_s += wait_s
+            t_log, wait_s, total_loss, n = time.perf_counter(), 0.0, 0.0, 0
+
+    elapsed = time.perf_counter() - t_start
+    print(
+        f"trained {steps} steps in {elapsed:.1f}s: {steps / elapsed:.1f} samples/s, "
+        f"data wait {100 * total_wait_s / elapsed:.0f}% with {num_workers} workers"
+    )
+    del batches  # shuts the workers down
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Behavior-clone TinyVLAPolicy on the expert demos")
+    parser.add_argument("--data", default="data/demo_trajectories.json")
+    parser.add_argument("--out", default="policy.pt")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--render", choices=sorted(RENDER_PRESETS),
+                        help="observation render preset the policy is trained (and later run) at "
+                             "(default: the one recorded in --data, else \"default\")")
+    parser.add_argument("--cell-px", type=int, help="override the preset's cell size")
+    parser.add_argument("--pad-px", type=int, help="override the preset's padding")
+    stream = parser.add_argument_group("streaming", "train on expert episodes generated on the fly instead of --data")
+    stream.add_argument("--stream", action="store_true")
+    stream.add_argument("--steps", type=int, default=5000)
+    stream.add_argument("--workers", type=int, default=2, help="DataLoader workers generating episodes")
+    stream.add_argument("--sizes", type=int, nargs="+", default=[7], help="grid sizes to sample")
+    stream.add_argument("--worker-configs", help="JSON list of per-worker {sizes, colors} configs")
+    stream.add_argument("--shuffle-buffer", type=int, default=256, help="samples each worker shuffles across")
+    stream.add_argument("--seed", type=int, default=0)
+    stream.add_argument("--log-every", type=int, default=500)
+    args = parser.parse_args()
+
+    def resolve_render_config(base):
+        render_config = RENDER_PRESETS[args.render] if args.render else base
+        if args.cell_px is not None:
+            render_config = replace(render_config, cell_px=args.cell_px)
+        if args.pad_px is not None:
+            render_config = replace(render_config, pad_px=args.pad_px)
+        return render_config
+
+    if args.stream:
+        render_config = resolve_render_config(RenderConfig())
+        if args.worker_configs:
+            with open(args.worker_configs, "r") as f:
+                worker_configs = json.load(f)
+        else:
+            worker_configs = [{"sizes": args.sizes}]
+        vocab = instruction_vocab()
+        try:
+            dataset = ExpertStreamDataset(
+                vocab, render_config=render_config, seed=args.seed, worker_configs=worker_configs,
+                shuffle_buffer=args.shuffle_buffer,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        model = train_stream(
+            dataset, vocab, steps=args.steps, lr=args.lr, num_workers=args.workers, log_every=args.log_every
+        )
+    else:
+        dataset = VLADataset(args.data)
+        # frames render lazily, so the demo file's config can still be overridden here
+        dataset.render_config = render_config = resolve_render_config(dataset.render_config)
+        vocab = build_vocab(dataset)
+
+        model = train(dataset, vocab, epochs=args.epochs, lr=args.lr)
 
-    torch.save(model.state_dict(), "policy.pt")
-    print("saved policy.pt")
+    save_checkpoint(args.out, model, render_config)
+    print(f"saved {args.out} (render {render_config})")
 
 
 if __name__ == "__main__":
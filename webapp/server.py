@@ -1,10 +1,22 @@
 import base64
+import hashlib
 import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import FastAPI
+import anyio
+import torch
+from fastapi import FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 from env.gridworld import GridWorld
 from env.renderer import render_obs
@@ -13,29 +25,169 @@ from models.dataset import VLADataset
 from agent.expert import expert_action
 
 
-app = FastAPI(title="vla-starter demo")
+CHECKPOINT_PATH = os.environ.get("VLA_CHECKPOINT", "policy.pt")
+DATA_PATH = "data/demo_trajectories.json"
+# Seconds between checks of CHECKPOINT_PATH for a new policy; 0 disables
+WATCH_INTERVAL = float(os.environ.get("VLA_WATCH_INTERVAL", "2.0"))
+# If set, /api/admin/* requires a matching X-Admin-Token header
+ADMIN_TOKEN = os.environ.get("VLA_ADMIN_TOKEN")
 
-# Serve static files (our index.html)
-app.mount("/static", StaticFiles(directory="webapp/static"), name="static")
+logger = logging.getLogger(__name__)
 
 # Global singleton state (simple, good for a demo)
 ENV: Optional[GridWorld] = None
 AGENT: Optional[LearnedAgent] = None
 OBS = None
 HISTORY = []  # list of (agent_pos, holding) for last few steps
+HISTORY_LEN = 6
+
+DATASET_VOCAB: Optional[dict] = None
+MODEL_INFO: dict = {}  # describes the checkpoint behind AGENT
+
+# Guards the AGENT / MODEL_INFO swap; held only for the assignment itself
+_AGENT_LOCK = threading.Lock()
+# Serializes loads so the watcher and the admin endpoint don't race
+_RELOAD_LOCK = threading.Lock()
+# Streaming sessions can race each other into the first agent load
+_INIT_LOCK = threading.Lock()
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop = threading.Event()
+    if WATCH_INTERVAL > 0:
+        threading.Thread(
+            target=_watch_checkpoint, args=(stop, WATCH_INTERVAL), name="checkpoint-watcher", daemon=True
+        ).start()
+    yield
+    stop.set()
+
+
+app = FastAPI(title="vla-starter demo", lifespan=lifespan)
+
+# Serve static files (our index.html)
+app.mount("/static", StaticFiles(directory="webapp/static"), name="static")
 
 
 def build_vocab_from_dataset(path: str):
+    # Only the instructions matter here, so skip rendering every frame
     ds = VLADataset(path)
     vocab = {"<unk>": 0}
-    for _, instr, _ in ds:
-        for tok in instr.lower().split():
+    for sample in ds.samples:
+        for tok in sample["obs"]["instruction"].lower().split():
             if tok not in vocab:
                 vocab[tok] = len(vocab)
     return vocab
 
 
+def dataset_vocab() -> dict:
+    # Only old bare-state_dict checkpoints need this; newer ones carry their
+    # own vocab, so the dataset is scanned at most once and only on demand.
+    global DATASET_VOCAB
+    if DATASET_VOCAB is None:
+        DATASET_VOCAB = build_vocab_from_dataset(DATA_PATH)
+    return DATASET_VOCAB
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_agent(path: str):
+    """
+    Load, warm up and validate a checkpoint without touching AGENT.
+    Raises if the checkpoint can't be loaded or produces bad logits.
+    Returns (agent, info).
+    """
+    t0 = time.perf_counter()
+    # Read once: the stat, the hash and the weights all come from these bytes,
+    # even if the file is replaced while we load.
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    agent = LearnedAgent(dataset_vocab, checkpoint_path=io.BytesIO(data))
+
+    # Warm-up doubles as validation: run a few full act() calls so the first
+    # real request doesn't pay for lazy init, and reject NaN/inf weights.
+    env = GridWorld(size=7, seed=0)
+    for _ in range(4):
+        obs = env.reset()
+        with torch.no_grad():
+            logits = agent.logits(obs)
+        if logits.shape != (6,) or not torch.isfinite(logits).all():
+            raise ValueError(f"checkpoint {path} produced invalid logits: {logits.tolist()}")
+        env.step(agent.act(obs))
+
+    info = {
+        "checkpoint": path,
+        "sha256": agent.checkpoint_sha256,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "loaded_at": datetime.now(timezone.utc).isoformat(),
+        "load_seconds": round(time.perf_counter() - t0, 4),
+    }
+    return agent, info
+
+
+def reload_agent(path: str = CHECKPOINT_PATH, blocking: bool = True) -> Optional[dict]:
+    """
+    Swap AGENT for the checkpoint at `path` once it has loaded cleanly.
+    In-flight requests keep the agent they already picked up, so they finish
+    on the old model. Returns the new MODEL_INFO, or None if another reload
+    is already running and `blocking` is False.
+    """
+    global AGENT, MODEL_INFO
+    if not _RELOAD_LOCK.acquire(blocking=blocking):
+        return None
+    try:
+        try:
+            agent, info = load_agent(path)
+        except Exception as e:
+            with _AGENT_LOCK:
+                MODEL_INFO = {**MODEL_INFO, "last_error": f"{path}: {e}"}
+            raise
+        with _AGENT_LOCK:
+            info["reloads"] = MODEL_INFO.get("reloads", -1) + 1
+            AGENT, MODEL_INFO = agent, info
+        logger.info("loaded %s (sha256 %s) in %.3fs", path, info["sha256"][:12], info["load_seconds"])
+        return info
+    finally:
+        _RELOAD_LOCK.release()
+
+
+def _watch_checkpoint(stop: threading.Event, interval: float):
+    pending = None  # (mtime, size) seen last poll but not loaded yet
+    failed = None  # (mtime, size) that already failed to load
+    while not stop.wait(interval):
+        try:
+            st = os.stat(CHECKPOINT_PATH)
+        except OSError:
+            continue
+        sig = (st.st_mtime_ns, st.st_size)
+        if AGENT is None or sig == (MODEL_INFO.get("mtime_ns"), MODEL_INFO.get("size")) or sig == failed:
+            pending = None
+            continue
+        if sig != pending:
+            # Wait one more interval so we don't read a half-written file
+            pending = sig
+            continue
+        pending = None
+        try:
+            if _file_sha256(CHECKPOINT_PATH) == MODEL_INFO.get("sha256"):
+                # touched but unchanged; just remember the new stat
+                with _AGENT_LOCK:
+                    MODEL_INFO.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                continue
+            reload_agent(CHECKPOINT_PATH)
+        except Exception:
+            failed = sig
+            logger.exception("checkpoint reload failed, keeping current policy")
+
+
 def obs_to_png_b64(obs) -> str:
     img = render_obs(obs)
     buf = io.BytesIO()
@@ -43,17 +195,67 @@ def obs_to_png_b64(obs) -> str:
     return base64.b64encode(buf.getvalue()).decode("utf-8")
 
 
+def ensure_agent() -> LearnedAgent:
+    if AGENT is None:
+        with _INIT_LOCK:
+            if AGENT is None:
+                reload_agent(CHECKPOINT_PATH)
+    return AGENT
+
+
 def ensure_init():
-    global ENV, AGENT, OBS
+    global ENV, OBS
     if ENV is None:
         ENV = GridWorld(size=7, seed=123)
-    if AGENT is None:
-        vocab = build_vocab_from_dataset("data/demo_trajectories.json")
-        AGENT = LearnedAgent(vocab, checkpoint_path="policy.pt")
+    ensure_agent()
     if OBS is None:
         OBS = ENV.reset("pick up the green block")
 
 
+def _sig(o):
+    return (tuple(o["agent_pos"]), o.get("holding"))
+
+
+def policy_step(env: GridWorld, agent: LearnedAgent, obs, history: list):
+    """
+    One learned-policy step with the demo's recovery logic.
+    `history` is updated in place so each caller can keep its own.
+    Returns (action, next_obs, reward, done, info, used_expert).
+    """
+    # choose an action from learned policy
+    action = agent.act(obs)
+
+    prev_sig = _sig(obs)
+    next_obs, reward, done, info = env.step(action)
+    next_sig = _sig(next_obs)
+
+    # update history
+    history.append(prev_sig)
+    del history[:-HISTORY_LEN]
+
+    # Detect simple 2-cycle oscillation: A,B,A,B
+    oscillating = False
+    if len(history) >= 4:
+        a, b, c, d = history[-4], history[-3], history[-2], history[-1]
+        if a == c and b == d and a != b:
+            oscillating = True
+
+    # Recovery:
+    # 1) if we are oscillating, fall back to the expert for one step
+    # 2) if action was somehow a no-op, also fall back once
+    used_expert = False
+    if oscillating or (next_sig == prev_sig):
+        action = expert_action(env, obs)
+        next_obs, reward, done, info = env.step(action)
+        used_expert = True
+
+        # refresh history after recovery step
+        history.append(prev_sig)
+        del history[:-HISTORY_LEN]
+
+    return action, next_obs, reward, done, info, used_expert
+
+
 @app.get("/", response_class=HTMLResponse)
 def root():
     # Serve the static page
@@ -81,42 +283,11 @@ def api_reset(instruction: Optional[str] = None):
 @app.post("/api/step")
 def api_step():
     ensure_init()
-    global OBS, HISTORY
-
-    def sig(o):
-        return (tuple(o["agent_pos"]), o.get("holding"))
-
-    # choose an action from learned policy
-    action = AGENT.act(OBS)
-
-    prev_sig = sig(OBS)
-    next_obs, reward, done, info = ENV.step(action)
-    next_sig = sig(next_obs)
-
-    # update history
-    HISTORY.append(prev_sig)
-    if len(HISTORY) > 6:
-        HISTORY = HISTORY[-6:]
-
-    # Detect simple 2-cycle oscillation: A,B,A,B
-    oscillating = False
-    if len(HISTORY) >= 4:
-        a, b, c, d = HISTORY[-4], HISTORY[-3], HISTORY[-2], HISTORY[-1]
-        if a == c and b == d and a != b:
-            oscillating = True
-
-    # Recovery:
-    # 1) if we are oscillating, fall back to the expert for one step
-    # 2) if action was somehow a no-op, also fall back once
-    if oscillating or (next_sig == prev_sig):
-        action = expert_action(ENV, OBS)
-        next_obs, reward, done, info = ENV.step(action)
-
-        # refresh history after recovery step
-        HISTORY.append(prev_sig)
-        if len(HISTORY) > 6:
-            HISTORY = HISTORY[-6:]
+    global OBS
 
+    # AGENT may be swapped by a reload mid-request; stick with this one
+    agent = AGENT
+    action, next_obs, reward, done, info, _ = policy_step(ENV, agent, OBS, HISTORY)
     OBS = next_obs
 
     return {
@@ -129,15 +300,152 @@ def api_step():
     }
 
 
-    action = AGENT.act(OBS)
-    next_obs, reward, done, info = ENV.step(action)
-    OBS = next_obs
+@app.get("/api/model")
+def api_model():
+    ensure_agent()
+    return MODEL_INFO
+
+
+@app.post("/api/admin/reload")
+def api_admin_reload(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reload CHECKPOINT_PATH now instead of waiting for the watcher.
+    Runs in the threadpool, so steps keep being served by the current model.
+    """
+    if ADMIN_TOKEN is not None and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="bad admin token")
+    path = CHECKPOINT_PATH
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"checkpoint not found: {path}")
+    try:
+        info = reload_agent(path, blocking=False)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"checkpoint rejected: {e}")
+    if info is None:
+        raise HTTPException(status_code=409, detail="a reload is already in progress")
+    return info
+
+
+def _stream_reset(env: GridWorld, instruction: Optional[str]):
+    if instruction is None or instruction.strip() == "":
+        obs = env.reset()
+    else:
+        obs = env.reset(instruction.strip())
+    msg = {
+        "type": "reset",
+        "instruction": obs["instruction"],
+        "png_b64": obs_to_png_b64(obs),
+        "done": False,
+        "info": {"step": 0, "holding": obs.get("holding")},
+    }
+    return obs, msg
 
-    return {
+
+def _stream_step(env: GridWorld, agent: LearnedAgent, obs, history: list):
+    # torch + PIL work for one frame; runs in the threadpool
+    action, next_obs, reward, done, info, used_expert = policy_step(env, agent, obs, history)
+    msg = {
+        "type": "step",
         "action": int(action),
         "reward": float(reward),
         "done": bool(done),
         "info": info,
-        "png_b64": obs_to_png_b64(OBS),
-        "instruction": OBS["instruction"],
+        "expert": used_expert,
+        "png_b64": obs_to_png_b64(next_obs),
+        "instruction": next_obs["instruction"],
     }
+    return next_obs, msg
+
+
+@app.websocket("/ws/episode")
+async def ws_episode(
+    websocket: WebSocket,
+    instruction: Optional[str] = None,
+    seed: Optional[int] = Query(None, ge=0),
+    interval: float = Query(0.25, ge=0.0, le=10.0),
+    max_steps: int = Query(50, ge=1, le=1000),
+    buffer: int = Query(4, ge=1, le=64),
+):
+    """
+    Stream a whole episode from a fresh reset.
+
+    Every session gets its own GridWorld, so many clients can stream at once
+    without touching the /api/* state. Frames are produced in the threadpool
+    and pushed through a bounded queue: the producer never runs more than
+    `buffer` frames ahead of what the client has accepted, and frames go out
+    at most once per `interval` seconds. The episode is cancelled as soon as
+    the client disconnects or sends {"type": "stop"}.
+    """
+    await websocket.accept()
+
+    if seed is None:
+        seed = random.randrange(2**31)
+    env = GridWorld(size=7, max_steps=max_steps, seed=seed)
+    frames_tx, frames_rx = anyio.create_memory_object_stream(max_buffer_size=buffer)
+    state = {"disconnected": False, "error": None}
+
+    async def produce():
+        async with frames_tx:
+            try:
+                agent = await run_in_threadpool(ensure_agent)
+                obs, msg = await run_in_threadpool(_stream_reset, env, instruction)
+                msg["seed"] = seed
+                await frames_tx.send(msg)
+
+                history = []
+                done = False
+                t = 0
+                while not done:
+                    obs, msg = await run_in_threadpool(_stream_step, env, agent, obs, history)
+                    t += 1
+                    msg["t"] = t
+                    done = msg["done"]
+                    await frames_tx.send(msg)
+            except Exception as e:
+                state["error"] = e
+                tg.cancel_scope.cancel()
+
+    async def send_frames():
+        next_at = anyio.current_time()
+        async with frames_rx:
+            async for msg in frames_rx:
+                await anyio.sleep(max(0.0, next_at - anyio.current_time()))
+                try:
+                    await websocket.send_json(msg)
+                except (WebSocketDisconnect, RuntimeError):
+                    # client went away between frames
+                    state["disconnected"] = True
+                    break
+                next_at = anyio.current_time() + interval
+        # episode finished; stop listening for the client
+        tg.cancel_scope.cancel()
+
+    async def watch_client():
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                state["disconnected"] = True
+                break
+            try:
+                if json.loads(msg.get("text") or "{}").get("type") == "stop":
+                    break
+            except (ValueError, AttributeError):
+                pass
+        tg.cancel_scope.cancel()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(produce)
+        tg.start_soon(send_frames)
+        tg.start_soon(watch_client)
+
+    if state["disconnected"]:
+        return
+
+    try:
+        if state["error"] is not None:
+            await websocket.send_json({"type": "error", "detail": str(state["error"])})
+            await websocket.close(code=1011)
+        else:
+            await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass